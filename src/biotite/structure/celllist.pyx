@@ -104,6 +104,7 @@ cdef class CellList:
     @cython.initializedcheck(False)
     @cython.boundscheck(False)
     @cython.wraparound(False)
+    @cython.cdivision(True)
     def __cinit__(self, atom_array not None, float cell_size,
                   bint periodic=False, box=None, np.ndarray selection=None):
         cdef float32 x, y, z
@@ -111,6 +112,7 @@ cdef class CellList:
         cdef int atom_array_i
         cdef int* cell_ptr = NULL
         cdef int length
+        cdef bint allocation_failed = False
 
         if isinstance(atom_array, AtomArrayStack):
             raise TypeError("Expected 'AtomArray' but got 'AtomArrayStack'")
@@ -185,29 +187,37 @@ cdef class CellList:
             self._has_selection = False
         
         # Fill cells
-        for atom_array_i in range(self._coord.shape[0]):
-            # Only put selected atoms into cell list
-            if not self._has_selection \
-               or self._selection[atom_array_i % self._orig_length]:
-                    x = self._coord[atom_array_i, 0]
-                    y = self._coord[atom_array_i, 1]
-                    z = self._coord[atom_array_i, 2]
-                    # Get cell indices for coordinates
-                    self._get_cell_index(x, y, z, &i, &j, &k)
-                    # Increment cell length and reallocate
-                    length = self._cell_length[i,j,k] + 1
-                    cell_ptr = <int*>self._cells[i,j,k]
-                    cell_ptr = <int*>realloc(cell_ptr, length * sizeof(int))
-                    if not cell_ptr:
-                        raise MemoryError()
-                    # Potentially increase max cell length
-                    if length > self._max_cell_length:
-                        self._max_cell_length = length
-                    # Store atom array index in respective cell
-                    cell_ptr[length-1] = atom_array_i
-                    # Store new cell pointer and length
-                    self._cell_length[i,j,k] = length
-                    self._cells[i,j,k] = <ptr> cell_ptr
+        # The GIL is released, so that cell lists can be created
+        # in multiple threads in parallel
+        with nogil:
+            for atom_array_i in range(self._coord.shape[0]):
+                # Only put selected atoms into cell list
+                if not self._has_selection \
+                   or self._selection[atom_array_i % self._orig_length]:
+                        x = self._coord[atom_array_i, 0]
+                        y = self._coord[atom_array_i, 1]
+                        z = self._coord[atom_array_i, 2]
+                        # Get cell indices for coordinates
+                        self._get_cell_index(x, y, z, &i, &j, &k)
+                        # Increment cell length and reallocate
+                        length = self._cell_length[i,j,k] + 1
+                        cell_ptr = <int*>self._cells[i,j,k]
+                        cell_ptr = <int*>realloc(
+                            cell_ptr, length * sizeof(int)
+                        )
+                        if not cell_ptr:
+                            allocation_failed = True
+                            break
+                        # Potentially increase max cell length
+                        if length > self._max_cell_length:
+                            self._max_cell_length = length
+                        # Store atom array index in respective cell
+                        cell_ptr[length-1] = atom_array_i
+                        # Store new cell pointer and length
+                        self._cell_length[i,j,k] = length
+                        self._cells[i,j,k] = <ptr> cell_ptr
+        if allocation_failed:
+            raise MemoryError()
             
     
     def __dealloc__(self):
@@ -443,24 +453,25 @@ cdef class CellList:
             (all_indices.shape[0], all_indices.shape[1]), -1, dtype=np.int32
         )
         coord_v = coord
-        for i in range(all_indices.shape[0]):
-            sq_radius = sq_radii[i]
-            x1 = coord_v[i,0]
-            y1 = coord_v[i,1]
-            z1 = coord_v[i,2]
-            array_i = 0
-            for j in range(all_indices.shape[1]):
-                coord_index = all_indices[i,j]
-                if coord_index != -1:
-                    x2 = self._coord[coord_index, 0]
-                    y2 = self._coord[coord_index, 1]
-                    z2 = self._coord[coord_index, 2]
-                    sq_dist = squared_distance(x1, y1, z1, x2, y2, z2)
-                    if sq_dist <= sq_radius:
-                        indices[i, array_i] = coord_index
-                        array_i += 1
-            if array_i > max_array_length:
-                max_array_length = array_i
+        with nogil:
+            for i in range(all_indices.shape[0]):
+                sq_radius = sq_radii[i]
+                x1 = coord_v[i,0]
+                y1 = coord_v[i,1]
+                z1 = coord_v[i,2]
+                array_i = 0
+                for j in range(all_indices.shape[1]):
+                    coord_index = all_indices[i,j]
+                    if coord_index != -1:
+                        x2 = self._coord[coord_index, 0]
+                        y2 = self._coord[coord_index, 1]
+                        z2 = self._coord[coord_index, 2]
+                        sq_dist = squared_distance(x1, y1, z1, x2, y2, z2)
+                        if sq_dist <= sq_radius:
+                            indices[i, array_i] = coord_index
+                            array_i += 1
+                if array_i > max_array_length:
+                    max_array_length = array_i
         
         return self.post_process(
             np.asarray(indices)[:, :max_array_length],
@@ -595,8 +606,14 @@ cdef class CellList:
         cdef int length = (2*max_cell_radius + 1)**3 * self._max_cell_length
         array_indices = np.full((len(coord), length), -1, dtype=np.int32)
         # Fill index array
-        cdef int max_array_length \
-            = self._find_adjacent_atoms(coord, array_indices, cell_radii)
+        cdef float32[:,:] coord_v = coord
+        cdef int[:,:] array_indices_v = array_indices
+        cdef int[:] cell_radii_v = cell_radii
+        cdef int max_array_length
+        with nogil:
+            max_array_length = self._find_adjacent_atoms(
+                coord_v, array_indices_v, cell_radii_v
+            )
         return array_indices[:, :max_array_length]
     
     
@@ -605,7 +622,7 @@ cdef class CellList:
     cdef int _find_adjacent_atoms(self,
                                   float32[:,:] coord,
                                   int[:,:] indices,
-                                  int[:] cell_radius):
+                                  int[:] cell_radius) nogil:
         """
         This method fills the given empty index array
         with actual indices of adjacent atoms.
@@ -693,7 +710,7 @@ cdef class CellList:
     @cython.wraparound(False)
     @cython.cdivision(True)
     cdef inline void _get_cell_index(self, float32 x, float32 y, float32 z,
-                             int* i, int* j, int* k):
+                             int* i, int* j, int* k) nogil:
         i[0] = <int>((x - self._min_coord[0]) / self._cellsize)
         j[0] = <int>((y - self._min_coord[1]) / self._cellsize)
         k[0] = <int>((z - self._min_coord[2]) / self._cellsize)
@@ -822,7 +839,7 @@ cdef inline void deallocate_ptrs(ptr[:,:,:] ptrs):
 
 
 cdef inline float32 squared_distance(float32 x1, float32 y1, float32 z1,
-                    float32 x2, float32 y2, float32 z2):
+                    float32 x2, float32 y2, float32 z2) nogil:
     cdef float32 diff_x = x2 - x1
     cdef float32 diff_y = y2 - y1
     cdef float32 diff_z = z2 - z1
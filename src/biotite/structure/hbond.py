@@ -10,10 +10,21 @@ __name__ = "biotite.structure"
 __author__ = "Daniel Bauer, Patrick Kunzmann"
 __all__ = ["hbond", "hbond_frequency"]
 
-from .geometry import distance, angle
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from .geometry import displacement
+from .util import vector_dot
 from .atoms import AtomArrayStack, stack
 from .celllist import CellList
+from .hbondgeometry import is_hbond
+
+
+# The maximum number of model-triplet combinations
+# that are processed at once in the periodic hydrogen bond check
+_CHUNK_SIZE = 2**14
+# The maximum distance a hydrogen atom may move between models,
+# so that the cell list of a previous model can still be used
+_CELL_LIST_SKIN = 0.5
 
 
 def hbond(atoms, selection1=None, selection2=None, selection1_type='both',
@@ -151,73 +162,54 @@ def hbond(atoms, selection1=None, selection2=None, selection1_type='both',
         selection2 = np.ones(atoms.array_length(), dtype=bool)
 
     if selection1_type == 'both':
-        # The two selections are separated into three selections:
-        # the original ones without the overlaping part
-        # and one containing the overlap
-        # This prevents redundant triplets and unnecessary computation 
-        overlap_selection = selection1 & selection2
-        # Original selections without overlaping part
-        exclusive_selection1 = selection1 & (~overlap_selection)
-        exclusive_selection2 = selection2 & (~overlap_selection)
-        
-        # Put selections to list for cleaner iteration
-        selections = [
-            exclusive_selection1, exclusive_selection2, overlap_selection
-        ]
-        selection_combinations = [
-            #(0,0),   is not included, would be same selection
-            #         as donor and acceptor simultaneously
-            (0,1),
-            (0,2),
-            (1,0),
-            #(1,1),   # same reason above
-            (1,2),
-            (2,0),
-            (2,1),
-            (2,2)     # overlaping part, combination is necessary
-        ]
-        
-        all_comb_triplets = []
-        all_comb_mask = []
-        for selection_index1, selection_index2 in selection_combinations:
-            donor_mask = selections[selection_index1]
-            acceptor_mask = selections[selection_index2]
-            if  np.count_nonzero(donor_mask) != 0 and \
-                np.count_nonzero(acceptor_mask) != 0:
-                    # Calculate triplets and mask
-                    triplets, mask = _hbond(
-                        atoms, donor_mask, acceptor_mask,
-                        donor_element_mask, acceptor_element_mask,
-                        cutoff_dist, cutoff_angle,
-                        donor_elements, acceptor_elements,
-                        box
-                    )
-                    all_comb_triplets.append(triplets)
-                    all_comb_mask.append(mask)
-        # Merge results from all combinations
-        triplets = np.concatenate(all_comb_triplets, axis=0)
-        mask = np.concatenate(all_comb_mask, axis=1)
-
+        # The hydrogen bonds are calculated at once for all atoms
+        # in either selection and filtered afterwards:
+        # Only bonds, where the donor is in one selection and the
+        # acceptor in the other one, are kept
+        # As the donor hydrogens are assigned for the union of both
+        # selections, a hydrogen within the cutoff of a donor in
+        # each selection is assigned only to the donor with the higher
+        # index, instead of once for each selection combination
+        # Furthermore, the order of the returned triplets may differ
+        # from separate calculations for each selection combination
+        donor_selection = selection1 | selection2
+        acceptor_selection = donor_selection
     elif selection1_type == 'donor':
-        triplets, mask = _hbond(
-            atoms, selection1, selection2,
-            donor_element_mask, acceptor_element_mask,
-            cutoff_dist, cutoff_angle,
-            donor_elements, acceptor_elements,
-            box
-        )
-    
+        donor_selection = selection1
+        acceptor_selection = selection2
     elif selection1_type == 'acceptor':
-        triplets, mask = _hbond(
-            atoms, selection2, selection1,
-            donor_element_mask, acceptor_element_mask,
-            cutoff_dist, cutoff_angle,
-            donor_elements, acceptor_elements,
-            box
-        )
-    
+        donor_selection = selection2
+        acceptor_selection = selection1
     else:
         raise ValueError(f"Unkown selection type '{selection1_type}'")
+    
+    # Filter donor/acceptor elements
+    donor_mask = donor_selection & donor_element_mask
+    acceptor_mask = acceptor_selection & acceptor_element_mask
+
+    # The donor hydrogens only depend on the topology and the first
+    # model, hence they are determined once before the actual search
+    # TODO use BondList if available
+    first_model_box = box[0] if box is not None else None
+    donor_h_mask, associated_donor_indices = _get_bonded_hydrogens(
+        atoms.coord[0], atoms.res_id, atoms.element,
+        donor_mask, first_model_box
+    )
+
+    triplets, mask = _hbond(
+        atoms, donor_h_mask, associated_donor_indices, acceptor_mask,
+        cutoff_dist, cutoff_angle, box
+    )
+
+    if selection1_type == 'both':
+        donor_i = triplets[:,0]
+        acceptor_i = triplets[:,2]
+        is_between_selections = (
+            (selection1[donor_i] & selection2[acceptor_i]) |
+            (selection2[donor_i] & selection1[acceptor_i])
+        )
+        triplets = triplets[is_between_selections]
+        mask = mask[:, is_between_selections]
 
     if single_model:
         # For a atom array (not stack),
@@ -229,48 +221,60 @@ def hbond(atoms, selection1=None, selection2=None, selection1_type='both',
         return triplets, mask
 
 
-def _hbond(atoms, donor_mask, acceptor_mask,
-           donor_element_mask, acceptor_element_mask,
-           cutoff_dist, cutoff_angle, donor_elements, acceptor_elements,
-           box):
-    
-    # Filter donor/acceptor elements
-    donor_mask    &= donor_element_mask
-    acceptor_mask &= acceptor_element_mask
-    
-    def _get_bonded_hydrogens(array, donor_mask, box, cutoff=1.5):
-        """
-        Helper function to find indices of associated hydrogens in atoms
-        for all donors in atoms[donor_mask].
-        The criterium is that the hydrogen must be in the same residue
-        and the distance must be smaller than the cutoff.
-
-        """
-        coord = array.coord
-        res_id = array.res_id
-        hydrogen_mask = (array.element == "H")
-        
-        donor_hydrogen_mask = np.zeros(len(array), dtype=bool)
-        associated_donor_indices = np.full(len(array), -1, dtype=int)
-
-        donor_indices = np.where(donor_mask)[0]
-        for donor_i in donor_indices:
-            candidate_mask = hydrogen_mask & (res_id == res_id[donor_i])
-            distances = distance(
-                coord[donor_i], coord[candidate_mask], box=box
-            )
-            donor_h_indices = np.where(candidate_mask)[0][distances <= cutoff]
-            for i in donor_h_indices:
-                associated_donor_indices[i] = donor_i
-                donor_hydrogen_mask[i] = True
-        
+def _get_bonded_hydrogens(coord, res_id, element, donor_mask, box,
+                          cutoff=1.5):
+    """
+    Helper function to find indices of associated hydrogens
+    for all donors in `donor_mask`.
+    The criterium is that the hydrogen must be in the same residue
+    and the distance must be smaller than the cutoff.
+
+    Only the coordinates of a single model and the required annotation
+    arrays are given, to avoid slicing the model out of the stack.
+    """
+    hydrogen_mask = (element == "H")
+
+    donor_hydrogen_mask = np.zeros(len(coord), dtype=bool)
+    associated_donor_indices = np.full(len(coord), -1, dtype=int)
+
+    # Donors and hydrogen atoms without defined coordinates
+    # cannot be bonded to each other
+    defined_mask = np.isfinite(coord).all(axis=-1)
+    donor_indices = np.where(donor_mask & defined_mask)[0]
+    hydrogen_indices = np.where(hydrogen_mask & defined_mask)[0]
+    if len(donor_indices) == 0 or len(hydrogen_indices) == 0:
         return donor_hydrogen_mask, associated_donor_indices
-            
 
-    # TODO use BondList if available
-    first_model_box = box[0] if box is not None else None
-    donor_h_mask, associated_donor_indices \
-        = _get_bonded_hydrogens(atoms[0], donor_mask, first_model_box)
+    # Find all hydrogen atoms within the cutoff of each donor
+    # with a single vectorized cell list query
+    # The cell list contains only the defined hydrogen atoms, so that
+    # undefined coordinates of other atoms do not matter
+    periodic = False if box is None else True
+    cell_list = CellList(
+        coord[hydrogen_indices], cell_size=cutoff,
+        periodic=periodic, box=box
+    )
+    # Rows correspond to donors, trailing '-1' values are padding
+    adjacent_h_indices = cell_list.get_atoms(
+        coord[donor_indices], radius=cutoff
+    )
+    donor_pos, h_pos = np.where(adjacent_h_indices != -1)
+    donor_i = donor_indices[donor_pos]
+    # Map indices in the cell list back to indices in the model
+    donor_h_i = hydrogen_indices[adjacent_h_indices[donor_pos, h_pos]]
+    # The hydrogen must be in the same residue as the donor
+    same_residue = (res_id[donor_i] == res_id[donor_h_i])
+    donor_i = donor_i[same_residue]
+    donor_h_i = donor_h_i[same_residue]
+
+    associated_donor_indices[donor_h_i] = donor_i
+    donor_hydrogen_mask[donor_h_i] = True
+
+    return donor_hydrogen_mask, associated_donor_indices
+
+
+def _hbond(atoms, donor_h_mask, associated_donor_indices, acceptor_mask,
+           cutoff_dist, cutoff_angle, box):
     donor_h_i = np.where(donor_h_mask)[0]
     acceptor_i = np.where(acceptor_mask)[0]
     if len(donor_h_i) == 0 or len(acceptor_i) == 0:
@@ -282,29 +286,89 @@ def _hbond(atoms, donor_mask, acceptor_mask,
     
     # Narrow the amount of possible acceptor to donor-H connections
     # down via the distance cutoff parameter using a cell list
-    # Save in acceptor-to-hydrogen matrix
-    # (true when distance smaller than cutoff)
-    coord = atoms.coord
-    possible_bonds = np.zeros(
-        (len(acceptor_i), len(donor_h_i)),
-        dtype=bool
-    )
+    # Instead of a dense acceptor-to-hydrogen matrix, only the index
+    # pairs of adjacent atoms are collected for each model
+    # as two parallel arrays of local acceptor and hydrogen indices
+    # Single precision is sufficient for the bond geometry
+    coord = np.ascontiguousarray(atoms.coord, dtype=np.float32)
     periodic = False if box is None else True
-    for model_i in range(atoms.stack_depth()):
-        donor_h_coord = coord[model_i, donor_h_mask]
-        acceptor_coord = coord[model_i, acceptor_mask]
-        box_for_model = box[model_i] if box is not None else None
+
+    def _split_into_segments():
+        # Split the models into segments of consecutive models,
+        # in which no donor hydrogen moved further than the skin
+        # distance from its position in the first model of the segment
+        # and in which the box is constant
+        # -> a single cell list can be used for all models of a segment
+        donor_h_coord = coord[:, donor_h_mask]
+        segments = []
+        ref_model_i = 0
+        for model_i in range(1, atoms.stack_depth()):
+            sq_displacement = np.sum(
+                (donor_h_coord[model_i] - donor_h_coord[ref_model_i])**2,
+                axis=-1
+            )
+            if np.max(sq_displacement) > _CELL_LIST_SKIN**2 or (
+                box is not None
+                and not np.array_equal(box[model_i], box[ref_model_i])
+            ):
+                segments.append(range(ref_model_i, model_i))
+                ref_model_i = model_i
+        segments.append(range(ref_model_i, atoms.stack_depth()))
+        return segments
+
+    def _find_candidates(segment):
+        ref_model_i = segment[0]
+        box_for_model = box[ref_model_i] if box is not None else None
         cell_list = CellList(
-            donor_h_coord, cell_size=cutoff_dist,
+            coord[ref_model_i, donor_h_mask], cell_size=cutoff_dist,
             periodic=periodic, box=box_for_model
         )
-        possible_bonds |= cell_list.get_atoms_in_cells(
-            acceptor_coord, as_mask=True
+        acceptor_candidates = []
+        donor_h_candidates = []
+        for model_i in segment:
+            acceptor_coord = coord[model_i, acceptor_mask]
+            # Rows correspond to acceptors,
+            # trailing '-1' values are padding
+            if model_i == ref_model_i:
+                adjacent_h_indices = cell_list.get_atoms_in_cells(
+                    acceptor_coord
+                )
+            else:
+                # The hydrogen atoms may have moved by up to the skin
+                # distance since the cell list was created
+                adjacent_h_indices = cell_list.get_atoms(
+                    acceptor_coord, radius=cutoff_dist + _CELL_LIST_SKIN
+                )
+            acceptor_pos, h_pos = np.where(adjacent_h_indices != -1)
+            acceptor_candidates.append(acceptor_pos.astype(np.int32))
+            donor_h_candidates.append(adjacent_h_indices[acceptor_pos, h_pos])
+        return (
+            np.concatenate(acceptor_candidates),
+            np.concatenate(donor_h_candidates)
         )
-    possible_bonds_i = np.where(possible_bonds)
+
+    segments = _split_into_segments()
+    if len(segments) > 1:
+        # The segments are independent of each other
+        # and the cell list releases the GIL in its compiled loops
+        # -> distribute segments over multiple threads
+        with ThreadPoolExecutor() as executor:
+            candidates = list(executor.map(_find_candidates, segments))
+    else:
+        candidates = [_find_candidates(segments[0])]
+    acceptor_candidates, donor_h_candidates = zip(*candidates)
+    # Union of the candidate pairs over all models:
+    # Each pair is encoded into a single integer, which is much faster
+    # to deduplicate than the rows of a two-column array
+    # The encoding also retains the order of acceptors and hydrogens
+    pair_codes = np.unique(
+        np.concatenate(acceptor_candidates).astype(np.int64)
+        * len(donor_h_i)
+        + np.concatenate(donor_h_candidates)
+    )
     # Narrow down
-    acceptor_i = acceptor_i[possible_bonds_i[0]]
-    donor_h_i = donor_h_i[possible_bonds_i[1]]
+    acceptor_i = acceptor_i[pair_codes // len(donor_h_i)]
+    donor_h_i = donor_h_i[pair_codes % len(donor_h_i)]
     
     # Build D-H..A triplets
     donor_i = associated_donor_indices[donor_h_i]
@@ -312,20 +376,59 @@ def _hbond(atoms, donor_mask, acceptor_mask,
     # Remove entries where donor and acceptor are the same
     triplets = triplets[donor_i != acceptor_i]
 
-     # Filter triplets that meet distance and angle condition
-    def _is_hbond(donor, donor_h, acceptor, box,
+    # Filter triplets that meet distance and angle condition
+    def _is_hbond(coord, triplets, box,
                   cutoff_dist=2.5, cutoff_angle=120):
-        cutoff_angle_rad = np.deg2rad(cutoff_angle)
-        theta = angle(donor, donor_h, acceptor, box=box)
-        dist = distance(donor_h, acceptor, box=box)
-        return (theta > cutoff_angle_rad) & (dist <= cutoff_dist)
+        # theta > cutoff_angle  <=>  cos(theta) < cos(cutoff_angle),
+        # since the cosine is monotonically decreasing in [0, pi]
+        # -> no 'arccos()' is required
+        cos_cutoff = np.cos(np.deg2rad(cutoff_angle))
+        hbond_mask = np.zeros((len(coord), len(triplets)), dtype=bool)
+        # Gather the coordinates of all triplet atoms at once
+        # -> shape (m, n, 3 atoms, 3 dimensions)
+        triplet_coord = np.take(coord, triplets.ravel(), axis=1) \
+                        .reshape(len(coord), len(triplets), 3, 3)
+        donor    = triplet_coord[:, :, 0]
+        donor_h  = triplet_coord[:, :, 1]
+        acceptor = triplet_coord[:, :, 2]
+        # Cheap first pass: the H..A distance criterion
+        # Compare squared distances to avoid the square root
+        v2 = displacement(donor_h, acceptor, box=box)
+        sq_dist_v2 = vector_dot(v2, v2)
+        in_distance = sq_dist_v2 <= cutoff_dist**2
+        # The angle is only computed for triplets that fulfill the
+        # distance criterion in at least one model
+        survivors = in_distance.any(axis=0)
+        if not survivors.any():
+            return hbond_mask
+        v1 = displacement(
+            donor_h[:, survivors], donor[:, survivors], box=box
+        )
+        v2 = v2[:, survivors]
+        sq_dist_v1 = vector_dot(v1, v1)
+        cos_theta = vector_dot(v1, v2) \
+                  / np.sqrt(sq_dist_v1 * sq_dist_v2[:, survivors])
+        hbond_mask[:, survivors] \
+            = (cos_theta < cos_cutoff) & in_distance[:, survivors]
+        return hbond_mask
     
-    hbond_mask = _is_hbond(
-        coord[:, triplets[:,0]],  # donors
-        coord[:, triplets[:,1]],  # donor hydrogens
-        coord[:, triplets[:,2]],  # acceptors
-        box, cutoff_dist=cutoff_dist, cutoff_angle=cutoff_angle
-    )
+    if box is None:
+        # Fused compiled kernel without intermediate arrays,
+        # that also checks the distance criterion before the angle
+        hbond_mask = is_hbond(coord, triplets, cutoff_dist, cutoff_angle)
+    else:
+        # The minimum-image convention requires the displacement
+        # calculation from the 'geometry' module
+        # The triplets are processed in chunks to keep the
+        # intermediate (m,n,3) arrays small enough to stay in cache
+        hbond_mask = np.zeros((len(coord), len(triplets)), dtype=bool)
+        chunk_size = max(1, _CHUNK_SIZE // len(coord))
+        for start in range(0, len(triplets), chunk_size):
+            stop = start + chunk_size
+            hbond_mask[:, start:stop] = _is_hbond(
+                coord, triplets[start:stop], box,
+                cutoff_dist=cutoff_dist, cutoff_angle=cutoff_angle
+            )
 
     # Reduce output to contain only triplets counted at least once
     is_counted = hbond_mask.any(axis=0)
@@ -350,7 +453,7 @@ def hbond_frequency(mask):
     
     Returns
     -------
-    ndarray, dtype=Float
+    ndarray, dtype=float32
         For each individual interaction *n* of the mask, returns the
         percentage of models *m*, in which this hydrogen bond is
         present.
@@ -370,4 +473,4 @@ def hbond_frequency(mask):
      0.026 0.132 0.053 0.026 0.158 0.026 0.868 0.211 0.026 0.921 0.316 0.079
      0.237 0.105 0.421 0.079 0.026 1.000 0.053 0.132 0.026 0.184]
     """
-    return mask.sum(axis=0)/len(mask)
+    return np.mean(mask, axis=0, dtype=np.float32)
@@ -0,0 +1,107 @@
+# This source code is part of the Biotite package and is distributed
+# under the 3-Clause BSD License. Please see 'LICENSE.rst' for further
+# information.
+
+"""
+This module provides the compiled geometry check for hydrogen bond
+candidates.
+"""
+
+__name__ = "biotite.structure"
+__author__ = "Daniel Bauer, Patrick Kunzmann"
+__all__ = ["is_hbond"]
+
+cimport cython
+cimport numpy as np
+from libc.math cimport sqrt
+
+import numpy as np
+
+ctypedef np.uint8_t uint8
+ctypedef np.int64_t int64
+ctypedef np.float32_t float32
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def is_hbond(np.ndarray coord, np.ndarray triplets,
+             double cutoff_dist, double cutoff_angle):
+    """
+    is_hbond(coord, triplets, cutoff_dist, cutoff_angle)
+
+    Check which Donor-H..Acceptor triplets fulfill the Baker-Hubbard
+    distance and angle criterion in each model.
+
+    The angle and distance are computed in a single pass over the
+    triplets, without intermediate arrays.
+    Instead of computing the angle :math:`\\theta` itself, the cosine
+    of :math:`\\theta` is compared to the cosine of the cutoff angle.
+    Likewise, the squared distance is compared to the squared cutoff
+    distance.
+
+    Parameters
+    ----------
+    coord : ndarray, dtype=float, shape=(m,n,3)
+        The coordinates of the models.
+    triplets : ndarray, dtype=int, shape=(k,3)
+        The atom indices of the *D_index*, *H_index*, *A_index*
+        triplets to be checked.
+    cutoff_dist : float
+        The maximal distance between the hydrogen and acceptor.
+    cutoff_angle : float
+        The minimum Donor-H..Acceptor angle in degree.
+
+    Returns
+    -------
+    mask : ndarray, dtype=bool, shape=(m,k)
+        True for each triplet and model, where the hydrogen bond
+        criterion is fulfilled.
+    """
+    cdef int model_i, triplet_i
+    cdef int64 donor_i, donor_h_i, acceptor_i
+    # Single precision is sufficient for the bond geometry
+    # and halves the memory bandwidth
+    cdef float32 dh_x, dh_y, dh_z
+    cdef float32 ah_x, ah_y, ah_z
+    cdef float32 sq_dh, sq_ah, dot
+
+    cdef float32[:,:,:] coord_v \
+        = coord.astype(np.float32, copy=False)
+    cdef int64[:,:] triplets_v = triplets.astype(np.int64, copy=False)
+    cdef uint8[:,:] mask = np.zeros(
+        (coord.shape[0], triplets.shape[0]), dtype=np.uint8
+    )
+    # theta > cutoff_angle  <=>  cos(theta) < cos(cutoff_angle),
+    # since the cosine is monotonically decreasing in [0, pi]
+    cdef float32 cos_cutoff = np.cos(np.deg2rad(cutoff_angle))
+    cdef float32 sq_cutoff_dist = cutoff_dist * cutoff_dist
+
+    for model_i in range(coord_v.shape[0]):
+        for triplet_i in range(triplets_v.shape[0]):
+            donor_i    = triplets_v[triplet_i, 0]
+            donor_h_i  = triplets_v[triplet_i, 1]
+            acceptor_i = triplets_v[triplet_i, 2]
+            # Vector from hydrogen to acceptor
+            ah_x = coord_v[model_i, acceptor_i, 0] \
+                 - coord_v[model_i, donor_h_i,  0]
+            ah_y = coord_v[model_i, acceptor_i, 1] \
+                 - coord_v[model_i, donor_h_i,  1]
+            ah_z = coord_v[model_i, acceptor_i, 2] \
+                 - coord_v[model_i, donor_h_i,  2]
+            sq_ah = ah_x*ah_x + ah_y*ah_y + ah_z*ah_z
+            if sq_ah > sq_cutoff_dist:
+                continue
+            # Vector from hydrogen to donor
+            dh_x = coord_v[model_i, donor_i,   0] \
+                 - coord_v[model_i, donor_h_i, 0]
+            dh_y = coord_v[model_i, donor_i,   1] \
+                 - coord_v[model_i, donor_h_i, 1]
+            dh_z = coord_v[model_i, donor_i,   2] \
+                 - coord_v[model_i, donor_h_i, 2]
+            sq_dh = dh_x*dh_x + dh_y*dh_y + dh_z*dh_z
+            dot = dh_x*ah_x + dh_y*ah_y + dh_z*ah_z
+            # cos(theta) = dot / (|dh| * |ah|)
+            if dot < cos_cutoff * sqrt(sq_dh * sq_ah):
+                mask[model_i, triplet_i] = True
+
+    return np.asarray(mask, dtype=bool)
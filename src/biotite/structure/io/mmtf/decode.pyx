@@ -21,7 +21,7 @@ ctypedef np.uint64_t uint64
 ctypedef np.float32_t float32
 
 
-def decode_array(int codec, bytes raw_bytes, int param):
+def decode_array(int codec, raw_bytes, int param):
     cdef np.ndarray array
     # Pass-through: 32-bit floating-point number array
     if   codec == 1:
@@ -54,8 +54,7 @@ def decode_array(int codec, bytes raw_bytes, int param):
     # Delta & run-length encoded 32-bit signed integer array
     elif codec == 8:
         array = np.frombuffer(raw_bytes, dtype=">i4").astype(np.int32)
-        return _decode_delta(
-               _decode_run_length(array))
+        return _decode_run_length_delta(array)
     # Integer & run-length encoded 32-bit floating-point number array
     elif codec == 9:
         array = np.frombuffer(raw_bytes, dtype=">i4").astype(np.int32)
@@ -65,9 +64,7 @@ def decode_array(int codec, bytes raw_bytes, int param):
     # & two-byte-packed 32-bit floating-point number array
     elif codec == 10:
         array = np.frombuffer(raw_bytes, dtype=">i2").astype(np.int16)
-        return _decode_integer(param, 
-               _decode_delta(
-               _decode_packed(array)))
+        return _decode_packed_delta_integer(array, param)
     # Integer encoded 32-bit floating-point number array
     elif codec == 11:
         array = np.frombuffer(raw_bytes, dtype=">i2").astype(np.int16)
@@ -94,10 +91,6 @@ def decode_array(int codec, bytes raw_bytes, int param):
         raise ValueError("Unknown codec with ID {codec}")
 
 
-def _decode_delta(np.ndarray array):
-    return np.cumsum(array, dtype=np.int32)
-
-
 def _decode_run_length(int32[:] array):
     cdef int length = 0
     cdef int i, j
@@ -148,5 +141,68 @@ def _decode_packed(PackedType[:] array):
     return np.asarray(output[:j])
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _decode_run_length_delta(int32[:] array):
+    """
+    Equivalent to
+    ``np.cumsum(_decode_run_length(array), dtype=np.int32)``,
+    but decodes both in a single pass.
+    """
+    cdef int length = 0
+    cdef int i, j, k
+    cdef int value, repeat
+    cdef int32 accumulator
+    # Determine length of output array by summing the run lengths
+    for i in range(1, array.shape[0], 2):
+        length += array[i]
+    cdef int32[:] output = np.empty(length, dtype=np.int32)
+    # Fill output array with the cumulative sum of the expanded runs
+    j = 0
+    accumulator = 0
+    for i in range(0, array.shape[0], 2):
+        value = array[i]
+        repeat = array[i+1]
+        for k in range(repeat):
+            accumulator += value
+            output[j] = accumulator
+            j += 1
+    return np.asarray(output)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _decode_packed_delta_integer(int16[:] array, int divisor):
+    """
+    Equivalent to decoding the packed array, computing the cumulative
+    sum via ``np.cumsum(..., dtype=np.int32)`` and dividing the result
+    by `divisor` via ``_decode_integer()``, but decodes all three steps
+    in a single pass, writing directly into the output floating point
+    array.
+    """
+    cdef int min_val = np.iinfo(np.int16).min
+    cdef int max_val = np.iinfo(np.int16).max
+    cdef int i, j
+    cdef int packed_val, unpacked_val
+    cdef int32 accumulator
+    cdef float32 divisor_f = divisor
+    # Pessimistic size assumption (see '_decode_packed()')
+    cdef float32[:] output = np.empty(array.shape[0], dtype=np.float32)
+    j = 0
+    unpacked_val = 0
+    accumulator = 0
+    for i in range(array.shape[0]):
+        packed_val = array[i]
+        unpacked_val += packed_val
+        if packed_val != max_val and packed_val != min_val:
+            accumulator += unpacked_val
+            output[j] = <float32>accumulator / divisor_f
+            unpacked_val = 0
+            j += 1
+    # Trim to correct size and return
+    return np.asarray(output[:j])
+
+
 def _decode_integer(int divisor, np.ndarray array):
     return np.divide(array, divisor, dtype=np.float32)
\ No newline at end of file
@@ -7,6 +7,7 @@ __author__ = "Patrick Kunzmann"
 __all__ = ["MMTFFile"]
 
 import io
+import mmap
 from collections.abc import MutableMapping
 import struct
 import copy
@@ -29,6 +30,13 @@ class MMTFFile(File, MutableMapping):
     If the dictionary value is an encoded array, the value automatically
     decoded.
     Decoded arrays are always returned as :class:`ndarray` instances.
+    Arrays that are accessed more than once are cached in decoded
+    form, i.e. further access of the same key does not decode the
+    array again, until the value is replaced.
+    Each access returns a new copy of the cached array.
+    The cache holds the decoded arrays in addition to the encoded file
+    content.
+    It can be emptied via :meth:`clear_cache()`.
     
     Examples
     --------
@@ -48,6 +56,10 @@ class MMTFFile(File, MutableMapping):
         self._content = {}
         self._content["mmtfVersion"] = "1.0.0"
         self._content["mmtfProducer"] = "UNKNOWN"
+        # Cache for decoded arrays that are accessed repeatedly
+        self._decoded = {}
+        # Keys of encoded arrays that were decoded once
+        self._accessed = set()
     
     @classmethod
     def read(self, file):
@@ -69,16 +81,27 @@ class MMTFFile(File, MutableMapping):
         # File name
         if isinstance(file, str):
             with open(file, "rb") as f:
-                mmtf_file._content = msgpack.unpackb(
-                    f.read(), use_list=True, raw=False
-                )
+                # Map the file into memory instead of reading its
+                # content into a separate 'bytes' object
+                try:
+                    mapped_file = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+                except (OSError, ValueError):
+                    # The file cannot be mapped,
+                    # e.g. an empty file or a pipe
+                    # -> fall back to the streaming unpacker
+                    mmtf_file._content = _unpack(f)
+                else:
+                    with mapped_file:
+                        mmtf_file._content = msgpack.unpackb(
+                            mapped_file, use_list=True, raw=False
+                        )
         # File object
         else:
             if not is_binary(file):
                 raise TypeError("A file opened in 'binary' mode is required")
-            mmtf_file._content = msgpack.unpackb(
-                file.read(), use_list=True, raw=False
-            )
+            mmtf_file._content = _unpack(file)
         return mmtf_file
     
     def write(self, file):
@@ -179,16 +202,38 @@ class MMTFFile(File, MutableMapping):
              + struct.pack(">i", param) \
              + raw_bytes
         self._content[key] = data
+        self._invalidate(key)
+    
+    def clear_cache(self):
+        """
+        Remove all cached decoded arrays to free memory.
+        """
+        self._decoded.clear()
+        self._accessed.clear()
     
     def __getitem__(self, key):
+        # A copy of the cached array is returned,
+        # so that in-place modifications by the caller
+        # do not alter the cached array
+        if key in self._decoded:
+            return self._decoded[key].copy()
         data = self._content[key]
         if isinstance(data, bytes) and data[0] == 0:
             # MMTF specific format -> requires decoding
-            codec     = struct.unpack(">i", data[0:4 ])[0]
-            length    = struct.unpack(">i", data[4:8 ])[0]
-            param     = struct.unpack(">i", data[8:12])[0]
-            raw_bytes = data[12:]
-            return decode_array(codec, raw_bytes, param)
+            codec, length, param = struct.unpack(">iii", data[:12])
+            # Zero-copy view on the encoded array
+            raw_bytes = memoryview(data)[12:]
+            array = decode_array(codec, raw_bytes, param)
+            if key in self._accessed:
+                # The array is accessed repeatedly -> cache it
+                self._decoded[key] = array
+                return array.copy()
+            else:
+                # Most arrays are only accessed once,
+                # e.g. in 'get_structure()'
+                # -> do not keep them in memory
+                self._accessed.add(key)
+                return array
         else:
             return data
     
@@ -197,9 +242,11 @@ class MMTFFile(File, MutableMapping):
             raise TypeError("Arrays that need to be encoded must be addeed "
                             "via 'set_array()'")
         self._content[key] = item
+        self._invalidate(key)
     
     def __delitem__(self, key):
         del self._content[key]
+        self._invalidate(key)
     
     def __iter__(self):
         return self._content.__iter__()
@@ -209,6 +256,31 @@ class MMTFFile(File, MutableMapping):
     
     def __contains__(self, item):
         return item in self._content
+    
+    def _invalidate(self, key):
+        # Remove the cached decoded array of a replaced value
+        self._decoded.pop(key, None)
+        self._accessed.discard(key)
+
+
+def _unpack(file):
+    """
+    Unpack the *MessagePack* content of a binary file object.
+
+    The unpacker reads the file in chunks, instead of reading the
+    entire file content into a separate :class:`bytes` object first.
+    """
+    # 'max_buffer_size=0' removes the default 100 MiB limit
+    # for large structures
+    unpacker = msgpack.Unpacker(
+        file, use_list=True, raw=False, max_buffer_size=0
+    )
+    try:
+        return unpacker.unpack()
+    except msgpack.OutOfData:
+        # Raise the same exception as 'msgpack.unpackb()'
+        # for empty or truncated input
+        raise ValueError("Unpack failed: incomplete input")
 
 
 def _encode_numpy(item):
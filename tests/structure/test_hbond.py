@@ -111,6 +111,56 @@ def test_hbond_with_selections():
     assert len(triplets) == 0
 
 
+def test_hbond_both_selection_type():
+    """
+    The hydrogen bonds found with the selection type 'both' should be
+    the union of the bonds found with the types 'donor' and
+    'acceptor', also if the selections overlap.
+    """
+    stack = load_structure(join(data_dir("structure"), "1l2y.mmtf"))
+    selection1 = stack.res_id <= 12
+    selection2 = stack.res_id >= 8
+
+    triplets, _ = struc.hbond(stack, selection1, selection2, "both")
+    donor_triplets, _ = struc.hbond(stack, selection1, selection2, "donor")
+    acceptor_triplets, _ = struc.hbond(
+        stack, selection1, selection2, "acceptor"
+    )
+    
+    test_set = set([tuple(tri) for tri in triplets])
+    ref_set = set([tuple(tri) for tri in donor_triplets]) \
+            | set([tuple(tri) for tri in acceptor_triplets])
+    assert len(test_set) == len(triplets)
+    assert test_set == ref_set
+
+
+@pytest.mark.parametrize(
+    "blanked_atom", ["carbon", "hydrogen", "donor_hydrogen"]
+)
+def test_hbond_nan_coord(blanked_atom):
+    """
+    Undefined coordinates of an atom should only remove the hydrogen
+    bonds this atom is part of.
+    """
+    atoms = load_structure(join(data_dir("structure"), "1l2y.mmtf"))[0]
+    ref_triplets = struc.hbond(atoms)
+    assert len(ref_triplets) > 0
+
+    if blanked_atom == "carbon":
+        blanked_i = np.where(atoms.element == "C")[0][0]
+    elif blanked_atom == "hydrogen":
+        # Hydrogen atom bonded to a carbon atom
+        blanked_i = np.where(atoms.atom_name == "HA")[0][0]
+    elif blanked_atom == "donor_hydrogen":
+        # Hydrogen atom that is part of a hydrogen bond
+        blanked_i = ref_triplets[0, 1]
+    atoms.coord[blanked_i] = np.nan
+    test_triplets = struc.hbond(atoms)
+
+    ref_triplets = ref_triplets[(ref_triplets != blanked_i).all(axis=-1)]
+    assert test_triplets.tolist() == ref_triplets.tolist()
+
+
 def test_hbond_single_selection():
     """
     If only selection1 or selection2 is defined, hbond should run
@@ -125,6 +175,30 @@ def test_hbond_single_selection():
     assert len(triplets) == 2
 
 
+@pytest.mark.parametrize("periodic", [False, True])
+def test_hbond_small_displacement(periodic):
+    """
+    For models with only small displacements of the hydrogen atoms,
+    the cell list of a previous model is reused.
+    Test whether a hydrogen bond is still found, if it is only formed
+    in a model, where the hydrogen atom has moved.
+    """
+    array = struc.AtomArray(3)
+    array.res_id = np.array([1, 1, 2])
+    array.element = np.array(["O", "H", "O"])
+    stack = struc.stack([array] * 2)
+    # Donor, hydrogen and an acceptor that is far away
+    stack.coord[0] = [[ 0.0, 0.0, 0.0], [ 1.0, 0.0, 0.0], [20.0, 0.0, 0.0]]
+    # Donor and hydrogen are moved slightly
+    # and the acceptor is within bond distance of the moved hydrogen
+    stack.coord[1] = [[ 0.4, 0.0, 0.0], [ 1.4, 0.0, 0.0], [ 3.7, 0.0, 0.0]]
+    stack.box = np.stack([np.identity(3) * 30] * 2)
+
+    triplets, mask = struc.hbond(stack, periodic=periodic)
+    assert triplets.tolist() == [[0, 1, 2]]
+    assert mask.tolist() == [[False], [True]]
+
+
 def test_hbond_frequency():
     mask = np.array([
         [True, True, True, True, True], # 1.0
@@ -2,9 +2,11 @@
 # under the 3-Clause BSD License. Please see 'LICENSE.rst' for further
 # information.
 
-from tempfile import TemporaryFile
+from tempfile import TemporaryFile, TemporaryDirectory, NamedTemporaryFile
 import glob
 import itertools
+import os
+import threading
 from os.path import join, splitext
 import numpy as np
 import pytest
@@ -46,6 +48,83 @@ def test_codecs(path):
                 assert (array1 == array2).all()
 
 
+@pytest.mark.parametrize("source", ["file_object", "pipe"])
+def test_read_stream(source):
+    """
+    Reading a file from a file object or from a path that cannot be
+    memory-mapped, like a named pipe, should give the same content as
+    reading it from a regular file path.
+    """
+    path = join(data_dir("structure"), "1l2y.mmtf")
+    ref_file = mmtf.MMTFFile.read(path)
+
+    if source == "file_object":
+        with open(path, "rb") as f:
+            test_file = mmtf.MMTFFile.read(f)
+    elif source == "pipe":
+        if not hasattr(os, "mkfifo"):
+            pytest.skip("Named pipes are not supported")
+        with open(path, "rb") as f:
+            content = f.read()
+        with TemporaryDirectory() as temp_dir:
+            pipe_path = join(temp_dir, "pipe.mmtf")
+            os.mkfifo(pipe_path)
+            def write_pipe():
+                with open(pipe_path, "wb") as pipe:
+                    pipe.write(content)
+            writer = threading.Thread(target=write_pipe)
+            writer.start()
+            test_file = mmtf.MMTFFile.read(pipe_path)
+            writer.join()
+
+    assert list(test_file.keys()) == list(ref_file.keys())
+    for key in ref_file:
+        test_value = test_file[key]
+        ref_value = ref_file[key]
+        if isinstance(ref_value, np.ndarray):
+            assert np.array_equal(test_value, ref_value)
+        else:
+            assert test_value == ref_value
+
+
+def test_read_empty():
+    """
+    Reading an empty file should raise the same exception for file
+    paths and file objects.
+    """
+    with NamedTemporaryFile() as temp:
+        with pytest.raises(ValueError):
+            mmtf.MMTFFile.read(temp.name)
+        with pytest.raises(ValueError):
+            mmtf.MMTFFile.read(temp)
+
+
+def test_decode_cache():
+    """
+    Check whether repeated access of a decoded array gives the same
+    values, whether in-place modifications of a returned array affect
+    later accesses and whether replaced values are decoded anew.
+    """
+    mmtf_file = mmtf.MMTFFile.read(join(data_dir("structure"), "1l2y.mmtf"))
+    array = mmtf_file["xCoordList"].copy()
+    # The array is decoded and cached at most in the following accesses
+    for _ in range(3):
+        modified_array = mmtf_file["xCoordList"]
+        assert np.array_equal(modified_array, array)
+        modified_array[:] = 0
+    
+    mmtf_file.clear_cache()
+    assert np.array_equal(mmtf_file["xCoordList"], array)
+    
+    mmtf_file.set_array("xCoordList", array + 1, codec=10, param=1000)
+    assert np.allclose(mmtf_file["xCoordList"], array + 1, atol=1e-3)
+    assert np.allclose(mmtf_file["xCoordList"], array + 1, atol=1e-3)
+
+    del mmtf_file["xCoordList"]
+    with pytest.raises(KeyError):
+        mmtf_file["xCoordList"]
+
+
 @pytest.mark.parametrize(
     "path, model",
     itertools.product(